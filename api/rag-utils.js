@@ -1,143 +1,102 @@
 /**
  * RAG (Retrieval-Augmented Generation) ユーティリティ
- * 会社情報をベクトル化し、類似度検索を行う
+ * ビルド済みの会社情報インデックスを読み込み、類似度検索を行う
  */
 
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
 const companyData = require('../data/companyInfo.json');
 
+// ビルド済みインデックス（python3 build-index.py で生成）
+// local-api-server.py と同じナレッジベース・ベクトルを共有し、コールドスタート時のベクトル化を省略する
+const INDEX_VERSION = 1;
+const index = require('../data/index.json');
+
+if (index.version !== INDEX_VERSION) {
+    throw new Error(`data/index.json version ${index.version} is not supported (expected ${INDEX_VERSION}). Run: python3 build-index.py`);
+}
+
+// 会社情報がインデックス作成後に更新されていないか確認（HTMLページは関数に含まれないため確認できない）
+const COMPANY_INFO_SOURCE = 'data/companyInfo.json';
+const companyInfoDigest = crypto.createHash('sha256')
+    .update(fs.readFileSync(path.join(__dirname, '..', COMPANY_INFO_SOURCE)))
+    .digest('hex');
+if (index.sources[COMPANY_INFO_SOURCE] !== companyInfoDigest) {
+    console.warn(`⚠️ data/index.json is out of date for ${COMPANY_INFO_SOURCE}. Run: python3 build-index.py`);
+}
+
+// 語彙 → インデックス番号
+const termIds = new Map(index.vocabulary.map((term, id) => [term, id]));
+
+// Python の str.isspace() と同じ空白文字
+const PY_SPACE = '\\t\\n\\v\\f\\r\\x1c-\\x20\\x85\\xa0\\u1680\\u2000-\\u200a\\u2028\\u2029\\u202f\\u205f\\u3000';
+const NON_WORD_PATTERN = new RegExp(`[^\\p{L}\\p{N}_${PY_SPACE}\\u3040-\\u309F\\u30A0-\\u30FF\\u4E00-\\u9FAF]`, 'gu');
+const SPACE_PATTERN = new RegExp(`[${PY_SPACE}]+`, 'u');
+const JAPANESE_CHAR_PATTERN = /[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]/g;
+
 /**
- * テキストをベクトル化する（簡易版）
- * 実際のプロダクションではOpenAI Embeddings APIを使用
+ * テキストをベクトル化する（local-api-server.py の text_to_vector と同じ分割）
+ * スペース区切りの2文字以上の単語と、日本語の1文字ずつを数える
  */
 function textToVector(text) {
-    // 簡易的なベクトル化（単語の出現頻度ベース）
-    const words = text.toLowerCase()
-        .replace(/[^\w\s]/g, '')
-        .split(/\s+/)
-        .filter(word => word.length > 2);
-    
-    const wordCount = {};
+    const wordCount = new Map();
+    if (!text || typeof text !== 'string') {
+        return wordCount;
+    }
+
+    const normalized = text.toLowerCase().replace(NON_WORD_PATTERN, ' ');
+    const words = normalized.split(SPACE_PATTERN)
+        .filter(word => [...word].length > 1)
+        .concat(normalized.match(JAPANESE_CHAR_PATTERN) || []);
+
     words.forEach(word => {
-        wordCount[word] = (wordCount[word] || 0) + 1;
+        wordCount.set(word, (wordCount.get(word) || 0) + 1);
     });
-    
+
     return wordCount;
 }
 
 /**
- * コサイン類似度を計算
+ * クエリとチャンクのコサイン類似度を計算
+ * チャンクのノルムはインデックスに保存済みのものを使う
  */
-function cosineSimilarity(vecA, vecB) {
-    const keys = new Set([...Object.keys(vecA), ...Object.keys(vecB)]);
+function cosineSimilarity(queryVector, queryNorm, chunk) {
+    if (queryNorm === 0 || chunk.norm === 0) return 0;
+
     let dotProduct = 0;
-    let normA = 0;
-    let normB = 0;
-    
-    for (const key of keys) {
-        const a = vecA[key] || 0;
-        const b = vecB[key] || 0;
-        dotProduct += a * b;
-        normA += a * a;
-        normB += b * b;
+    for (let i = 0; i < chunk.terms.length; i++) {
+        dotProduct += chunk.counts[i] * (queryVector.get(chunk.terms[i]) || 0);
     }
-    
-    if (normA === 0 || normB === 0) return 0;
-    
-    return dotProduct / (Math.sqrt(normA) * Math.sqrt(normB));
+
+    return dotProduct / (queryNorm * chunk.norm);
 }
 
 /**
- * 会社情報をチャンクに分割してベクトル化
+ * ナレッジベースを返す（ビルド済みインデックスのチャンク）
  */
 function createKnowledgeBase() {
-    const knowledgeBase = [];
-    
-    // 会社基本情報
-    knowledgeBase.push({
-        id: 'company-basic',
-        content: `${companyData.company.name}（${companyData.company.japaneseName}）は${companyData.company.description}。${companyData.company.founded}年に設立され、${companyData.company.location}に本社を構えています。`,
-        category: 'company',
-        vector: textToVector(`${companyData.company.name} ${companyData.company.japaneseName} ${companyData.company.description}`)
-    });
-    
-    // 代表者情報
-    knowledgeBase.push({
-        id: 'representative',
-        content: `代表取締役CEOの${companyData.representative.name}です。${companyData.representative.message} ${companyData.representative.background}`,
-        category: 'representative',
-        vector: textToVector(`${companyData.representative.name} ${companyData.representative.message} ${companyData.representative.background}`)
-    });
-    
-    // サービス情報
-    companyData.services.forEach(service => {
-        knowledgeBase.push({
-            id: `service-${service.id}`,
-            content: `${service.name}: ${service.description} 対象: ${service.target} 料金: ${service.price}`,
-            category: 'service',
-            vector: textToVector(`${service.name} ${service.description} ${service.target} ${service.price}`)
-        });
-        
-        // サービス詳細
-        service.features.forEach((feature, index) => {
-            knowledgeBase.push({
-                id: `service-${service.id}-feature-${index}`,
-                content: `${service.name}の機能: ${feature}`,
-                category: 'service-feature',
-                vector: textToVector(`${service.name} ${feature}`)
-            });
-        });
-    });
-    
-    // 会社の価値観
-    companyData.companyValues.forEach((value, index) => {
-        knowledgeBase.push({
-            id: `value-${index}`,
-            content: `${value.title}: ${value.description}`,
-            category: 'values',
-            vector: textToVector(`${value.title} ${value.description}`)
-        });
-    });
-    
-    // FAQ
-    companyData.faq.forEach((faq, index) => {
-        knowledgeBase.push({
-            id: `faq-${index}`,
-            content: `Q: ${faq.question} A: ${faq.answer}`,
-            category: 'faq',
-            vector: textToVector(`${faq.question} ${faq.answer}`)
-        });
-    });
-    
-    // 事例紹介
-    companyData.caseStudies.forEach((caseStudy, index) => {
-        knowledgeBase.push({
-            id: `case-${index}`,
-            content: `${caseStudy.title}: ${caseStudy.description} 業界: ${caseStudy.industry} 成果: ${caseStudy.results.join(', ')}`,
-            category: 'case-study',
-            vector: textToVector(`${caseStudy.title} ${caseStudy.description} ${caseStudy.industry} ${caseStudy.results.join(' ')}`)
-        });
-    });
-    
-    // 連絡先情報
-    knowledgeBase.push({
-        id: 'contact',
-        content: `連絡先: ${companyData.contact.office} 営業時間: ${companyData.contact.businessHours} 初回相談: ${companyData.contact.consultation} 回答時間: ${companyData.contact.responseTime}`,
-        category: 'contact',
-        vector: textToVector(`${companyData.contact.office} ${companyData.contact.businessHours} ${companyData.contact.consultation}`)
-    });
-    
-    return knowledgeBase;
+    return index.chunks;
 }
 
 /**
  * 関連する情報を検索
  */
 function searchRelevantInfo(query, knowledgeBase, topK = 3) {
-    const queryVector = textToVector(query);
-    
+    // クエリの単語をインデックス番号に変換（語彙にない単語はノルムにのみ寄与）
+    const queryVector = new Map();
+    let squaredNorm = 0;
+    for (const [word, count] of textToVector(query)) {
+        squaredNorm += count * count;
+        if (termIds.has(word)) {
+            queryVector.set(termIds.get(word), count);
+        }
+    }
+    const queryNorm = Math.sqrt(squaredNorm);
+
     const similarities = knowledgeBase.map(item => ({
         ...item,
-        similarity: cosineSimilarity(queryVector, item.vector)
+        similarity: cosineSimilarity(queryVector, queryNorm, item)
     }));
     
     // 類似度でソートして上位K件を返す
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+RAG用インデックスのビルドスクリプト
+local-api-server.py と同じ方法でナレッジベースを作成し、data/index.json に書き出します
+（api/rag-utils.js もこのファイルを読み込むため、実行時のベクトル化は不要になります）
+
+使い方:
+    python3 build-index.py           # data/index.json を生成
+    python3 build-index.py --check   # インデックスが最新か、Python と JS のベクトル検索の順位が一致するか、
+                                     # HTMLページのセクション分割が SECTION_CASES のとおりかを確認
+
+--check が比較するのはベクトル類似度による順位（vector_search と searchRelevantInfo）のみです。
+local-api-server.py の search_relevant_info はこれにキーワードによる優先付けを加え、閾値も異なるため、
+ローカルの応答そのものが本番と一致することまでは確認しません。
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# ベクトル検索の順位の一致を確認するクエリ
+PARITY_QUERIES = [
+    '代表者について教えてください',
+    '料金はいくらですか',
+    'AI導入コンサルティングの内容',
+    'システム運用サポートは24時間対応ですか',
+    'ECサイトの売上を上げたい',
+    'システム開発の期間',
+    '会社の所在地とアクセス',
+    '営業時間を教えて',
+    '製造業の導入事例はありますか',
+    '個人情報の取り扱いについて',
+    'クッキーは使用していますか',
+    '企業理念',
+    'お問い合わせ方法',
+    'AI chatbot development',
+    'hello',
+    '😀 絵文字だけ',
+    '',
+]
+PARITY_TOP_K = 3
+PARITY_THRESHOLD = 0.1
+
+# HTMLページのセクション分割の確認ケース（HTML → (見出し, 本文) のリスト）
+SECTION_CASES = [
+    # 見出しを含むラッパーの前の本文は前のセクションに残す
+    ('<h1>Title</h1><div><p>Intro text</p><h2>Sec</h2><p>sec body</p></div>',
+     [('Title', 'Intro text'), ('Sec', 'sec body')]),
+    ('<section><h2>A</h2><div><p>body A</p><span>end A</span><h3>B</h3><p>body B</p></div></section>',
+     [('A', 'body A end A'), ('B', 'body B')]),
+    # 手順番号・ラベルは次の見出しのセクションに含める
+    ('<h2>Flow</h2><p>desc</p><div><div><div>1</div><div><h3>Hearing</h3><p>hearing</p></div></div>'
+     '<div><div>2</div><div><h3>Plan</h3><p>plan</p></div></div></div>',
+     [('Flow', 'desc'), ('Hearing', '1 hearing'), ('Plan', '2 plan')]),
+    ('<p>lead</p><div><div>A</div><h3>Voice</h3><p>comment</p></div>',
+     [('', 'lead'), ('Voice', 'A comment')]),
+    # リストの最後の項目など、ラベルではない短いテキストは前のセクションに残す
+    ('<h2>Skills</h2><ul><li>Python</li><li>SQL</li></ul><h2>Next</h2><p>next</p>',
+     [('Skills', 'Python SQL'), ('Next', 'next')]),
+    # 見出しの前後のテキストが連結されない
+    ('<p>two<h2>B</h2>three', [('', 'two'), ('B', 'three')]),
+    ('<p>one</p><p>two<h2>B</h2>three</p>', [('', 'one'), ('B', 'two three')]),
+    # 閉じられていない見出しは本文として残す
+    ('<h2>X</h2><p>body</p><h2>unclosed heading<div>more</div>', [('X', 'body'), ('X', 'unclosed heading more')]),
+]
+
+# api/rag-utils.js の検索結果をJSONで出力するスクリプト
+NODE_SEARCH = """
+const { createKnowledgeBase, searchRelevantInfo } = require('./api/rag-utils');
+const { queries, topK } = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const knowledgeBase = createKnowledgeBase();
+const results = queries.map(query =>
+    searchRelevantInfo(query, knowledgeBase, topK).map(item => [item.id, item.similarity])
+);
+process.stdout.write(JSON.stringify(results));
+"""
+
+def load_server():
+    """local-api-server.py をモジュールとして読み込み"""
+    spec = importlib.util.spec_from_file_location('local_api_server', os.path.join(ROOT, 'local-api-server.py'))
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    return server
+
+def build(server):
+    """ナレッジベースを作成してインデックスに変換"""
+    knowledge_base = server.create_knowledge_base()
+    return server.export_index(knowledge_base, server.current_source_digests())
+
+def serialize(index):
+    return json.dumps(index, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+def python_search(server, knowledge_base, query):
+    matches = server.vector_search(query, knowledge_base, PARITY_THRESHOLD)
+    return [[item['id'], item['similarity']] for item in matches[:PARITY_TOP_K]]
+
+def node_search(queries):
+    completed = subprocess.run(
+        ['node', '-e', NODE_SEARCH],
+        input=json.dumps({'queries': queries, 'topK': PARITY_TOP_K}),
+        capture_output=True, text=True, encoding='utf-8', cwd=ROOT, check=True
+    )
+    return json.loads(completed.stdout)
+
+def check_sections(server):
+    """SECTION_CASES のとおりにセクション分割されることを確認"""
+    ok = True
+    for html, expected in SECTION_CASES:
+        parser = server.SiteSectionParser()
+        parser.feed(html)
+        parser.close()
+        actual = [(heading, text) for _, _, heading, text in parser.chunks]
+        if actual != expected:
+            print(f"❌ Sections differ for {html!r}:")
+            print(f"  Expected: {expected}")
+            print(f"  Actual:   {actual}")
+            ok = False
+    if ok:
+        print(f"✅ Section splitting matches for {len(SECTION_CASES)} cases")
+    return ok
+
+def check(server, index):
+    """インデックスが最新であること、Python と JS のベクトル検索の上位K件が一致することを確認"""
+    ok = True
+    try:
+        with open(server.INDEX_PATH, 'r', encoding='utf-8') as f:
+            if f.read() != serialize(index):
+                print(f"❌ {server.INDEX_PATH} is out of date. Run: python3 build-index.py")
+                ok = False
+    except FileNotFoundError:
+        print(f"❌ {server.INDEX_PATH} not found. Run: python3 build-index.py")
+        return False
+
+    knowledge_base = server.import_index(index)
+    try:
+        node_results = node_search(PARITY_QUERIES)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ Failed to run api/rag-utils.js: {getattr(e, 'stderr', '') or e}")
+        return False
+
+    for query, node_result in zip(PARITY_QUERIES, node_results):
+        python_result = python_search(server, knowledge_base, query)
+        if python_result != node_result:
+            print(f"❌ Results differ for '{query}':")
+            print(f"  Python: {python_result}")
+            print(f"  JS:     {node_result}")
+            ok = False
+    if ok:
+        print(f"✅ {server.INDEX_PATH} is up to date and top-{PARITY_TOP_K} vector rankings match for {len(PARITY_QUERIES)} queries")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG用インデックス（data/index.json）を生成します")
+    parser.add_argument('--check', action='store_true',
+                        help="生成せずに、インデックスが最新か・Python と JS のベクトル検索の順位が一致するかを確認")
+    args = parser.parse_args()
+
+    # local-api-server.py と同じくリポジトリのルートを基準にファイルを読む
+    os.chdir(ROOT)
+    server = load_server()
+    index = build(server)
+
+    if args.check:
+        sections_ok = check_sections(server)
+        return 0 if check(server, index) and sections_ok else 1
+
+    with open(server.INDEX_PATH, 'w', encoding='utf-8') as f:
+        f.write(serialize(index))
+    print(f"✅ {server.INDEX_PATH}: {len(index['chunks'])} chunks, {len(index['vocabulary'])} terms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
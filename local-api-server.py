@@ -10,8 +10,17 @@ import json
 import urllib.parse
 import re
 import math
-from collections import Counter
+import hashlib
+import html.parser
+import io
+import marshal
+import os
+import sys
+import time
+from collections import Counter, deque
 from datetime import datetime
+from functools import lru_cache
+from json.encoder import encode_basestring
 
 # RAG機能を直接実装
 def load_company_data():
@@ -78,7 +87,10 @@ def create_knowledge_base():
     # 会社基本情報
     company = company_data.get('company', {})
     if company:
-        content = f"{company.get('name', 'TechCorp')}は{company.get('description', 'AI技術を活用した企業向けソリューションを提供')}。{company.get('founded', '2020年')}年に設立され、{company.get('location', '東京都渋谷区')}に本社を構えています。"
+        name = company.get('name', 'TechCorp')
+        if company.get('japaneseName'):
+            name = f"{name}（{company['japaneseName']}）"
+        content = f"{name}は{company.get('description', 'AI技術を活用した企業向けソリューションを提供')}。{company.get('founded', '2020年')}年に設立され、{company.get('location', '東京都渋谷区')}に本社を構えています。"
         knowledge_base.append({
             'id': 'company-basic',
             'content': content,
@@ -119,6 +131,17 @@ def create_knowledge_base():
                 'vector': text_to_vector(content)
             })
     
+    # 会社の価値観
+    company_values = company_data.get('companyValues', [])
+    for i, value in enumerate(company_values):
+        content = f"{value.get('title', '')}: {value.get('description', '')}"
+        knowledge_base.append({
+            'id': f"value-{i}",
+            'content': content,
+            'category': 'values',
+            'vector': text_to_vector(content)
+        })
+    
     # FAQ
     faq = company_data.get('faq', [])
     for i, item in enumerate(faq):
@@ -130,6 +153,17 @@ def create_knowledge_base():
             'vector': text_to_vector(content)
         })
     
+    # 事例紹介
+    case_studies = company_data.get('caseStudies', [])
+    for i, case_study in enumerate(case_studies):
+        content = f"{case_study.get('title', '')}: {case_study.get('description', '')} 業界: {case_study.get('industry', '')} 成果: {', '.join(case_study.get('results', []))}"
+        knowledge_base.append({
+            'id': f"case-{i}",
+            'content': content,
+            'category': 'case-study',
+            'vector': text_to_vector(content)
+        })
+    
     # 連絡先情報
     contact = company_data.get('contact', {})
     if contact:
@@ -141,7 +175,362 @@ def create_knowledge_base():
             'vector': text_to_vector(content)
         })
     
-    return knowledge_base
+    # サイトのHTMLページ（更新されたページのみ再取り込み）
+    # ページのチャンクは取り込み結果のリストをそのまま参照し、コピーしない
+    ingest_site_pages()
+    
+    return KnowledgeBase(knowledge_base, *site_page_chunks())
+
+class KnowledgeBase:
+    """複数の項目リストをコピーせずに連結して1つのナレッジベースとして扱う"""
+
+    def __init__(self, *segments):
+        self.segments = segments
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+# サイトのHTMLページの取り込み
+# ページをブロック単位で読み込みながら解析し、見出しごとのセクションを
+# 一定文字数のチャンクに分割して逐次生成する（ページサイズによらずメモリ使用量は一定）
+SITE_PAGES = ['about.html', 'services.html', 'results.html', 'message.html', 'privacy.html']
+SITE_CHUNK_CHARS = 300
+SITE_READ_BLOCK = 64 * 1024
+
+class SiteSectionParser(html.parser.HTMLParser):
+    """本文のテキストを見出し（h1〜h3）単位のセクションに分けてチャンク化
+
+    見出しの直前にある短いテキスト（手順番号や「A」などのラベル）は、前のセクションではなく
+    その見出しのセクションに含める。ラベルとみなすのは、直前に閉じたブロック（内側にブロックを
+    含まないもの）のテキスト、または開いているブロックの先頭のテキストのうち LABEL_MAX_CHARS 以下のもので、
+    現在のセクションに本文がある場合に限る。それ以外のテキストは現在のセクションに確定する。
+    """
+
+    SKIP_TAGS = {'head', 'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'header', 'nav', 'footer'}
+    HEADING_TAGS = {'h1', 'h2', 'h3'}
+    BLOCK_TAGS = {
+        'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'fieldset',
+        'figcaption', 'figure', 'form', 'li', 'main', 'ol', 'p', 'pre', 'section',
+        'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul'
+    }
+    LABEL_MAX_CHARS = 8
+    # 閉じられていない見出しやタグでメモリ使用量が増え続けないための上限
+    HEADING_MAX_CHARS = 200
+    MAX_BLOCK_DEPTH = 256
+
+    def __init__(self, chunk_chars=SITE_CHUNK_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.chunk_chars = chunk_chars
+        self.skip_depth = 0
+        self.heading_parts = None
+        self.heading_length = 0
+        self.heading = ''
+        self.label = ''
+        self.section_key = 'top'
+        self.section_counts = Counter()
+        self.chunk_index = 0
+        self.buffer = ''
+        # 開いているブロック（タグ、開始位置、内側にブロックを含まないか）
+        self.blocks = []
+        # ラベルの候補として確定を保留しているテキストと、それより前に処理したテキストの長さ
+        self.pending = ''
+        self.consumed = 0
+        # ブロックまたは見出しが閉じた後か（以降のテキストはラベルではなく本文）
+        self.after_close = False
+        self.chunks = deque()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif self.skip_depth:
+            return
+        elif tag in self.HEADING_TAGS:
+            self._close_heading()
+            if self.pending.strip() and self._has_body():
+                self.label = self.pending.strip()
+                self.consumed += len(self.pending)
+                self.pending = ''
+            else:
+                self._commit()
+            self.flush()
+            self.heading_parts = []
+            self.heading_length = 0
+        elif tag in self.BLOCK_TAGS:
+            # 閉じられていない見出しはブロックの開始で本文として扱う
+            self._close_heading()
+            self._append(' ')
+            if len(self.blocks) < self.MAX_BLOCK_DEPTH:
+                if self.blocks:
+                    self.blocks[-1][2] = False
+                self.blocks.append([tag, self.consumed + len(self.pending), True])
+            self.after_close = False
+        elif self.heading_parts is None:
+            self._append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif self.skip_depth:
+            return
+        elif tag in self.HEADING_TAGS and self.heading_parts is not None:
+            self._start_section(' '.join(''.join(self.heading_parts).split()))
+        elif self.heading_parts is None:
+            self._append(' ')
+            if tag in self.BLOCK_TAGS and any(block[0] == tag for block in self.blocks):
+                # 閉じられていない内側のブロックもまとめて閉じる
+                depth = max(i for i, block in enumerate(self.blocks) if block[0] == tag)
+                _, start, leaf = self.blocks[depth]
+                del self.blocks[depth:]
+                # 閉じたブロックより前のテキストは確定し、内側にブロックを含まない短いブロックのテキストはラベルとして保留
+                self._commit(max(start - self.consumed, 0))
+                text = self.pending.strip()
+                if not leaf or not text or len(text) > self.LABEL_MAX_CHARS or not self._has_body():
+                    self._commit()
+                self.after_close = True
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.heading_parts is not None:
+            self.heading_parts.append(data)
+            self.heading_length += len(data)
+            if self.heading_length > self.HEADING_MAX_CHARS:
+                self._close_heading()
+        else:
+            self._append(data)
+
+    def _close_heading(self):
+        """閉じられていない（または長すぎる）見出しのテキストを本文として扱う"""
+        if self.heading_parts is not None:
+            text = ''.join(self.heading_parts)
+            self.heading_parts = None
+            label, self.label = self.label, ''
+            self._append(f" {label} {text} ")
+
+    def _start_section(self, heading):
+        """見出しからセクションの安定したキーを生成（同名の見出しは出現順で区別）"""
+        self.heading_parts = None
+        self.heading = heading
+        key = hashlib.sha1(heading.encode('utf-8')).hexdigest()[:8]
+        self.section_counts[key] += 1
+        if self.section_counts[key] > 1:
+            key = f"{key}-{self.section_counts[key]}"
+        self.section_key = key
+        self.chunk_index = 0
+        # 見出しの前のラベルは新しいセクションの本文にする
+        self.buffer = f"{self.label} "
+        self.label = ''
+        self.after_close = True
+
+    def _has_body(self):
+        """現在のセクションに確定済みの本文があるか"""
+        return self.chunk_index > 0 or bool(self.buffer.strip())
+
+    def _append(self, text):
+        self.pending += text
+        # 閉じたブロックの後のテキストや、開いているブロックの長いテキストはラベルではない
+        offset = max(self.blocks[-1][1] - self.consumed, 0) if self.blocks else 0
+        if (self.after_close and text.strip()) or len(self.pending) > self.chunk_chars \
+                or len(self.pending[offset:].strip()) > self.LABEL_MAX_CHARS:
+            self._commit()
+
+    def _commit(self, length=None):
+        """保留中のテキストの先頭 length 文字（省略時はすべて）を現在のセクションに確定"""
+        if length is None:
+            length = len(self.pending)
+        if not length:
+            return
+        self.buffer += self.pending[:length]
+        self.pending = self.pending[length:]
+        self.consumed += length
+        if len(self.buffer) >= self.chunk_chars * 2:
+            self._cut_chunks()
+
+    def _cut_chunks(self):
+        """バッファから chunk_chars 以下のチャンクを切り出す（句点・空白で区切る）"""
+        text = ' '.join(self.buffer.split())
+        while len(text) > self.chunk_chars:
+            head = text[:self.chunk_chars]
+            cut = head.rfind('。') + 1 or head.rfind(' ') + 1 or self.chunk_chars
+            self._emit(text[:cut].strip())
+            text = text[cut:].lstrip()
+        # 末尾の空白は残す（続くテキストと単語がつながらないように）
+        if text and self.buffer[-1:].isspace():
+            text += ' '
+        self.buffer = text
+
+    def _emit(self, text):
+        if text:
+            self.chunks.append((self.section_key, self.chunk_index, self.heading, text))
+            self.chunk_index += 1
+
+    def flush(self):
+        """現在のセクションの残りをチャンクとして確定"""
+        self._cut_chunks()
+        self._emit(self.buffer.strip())
+        self.buffer = ''
+
+    def close(self):
+        """文書の終わりで、閉じられていない見出し・保留中のテキストも確定"""
+        super().close()
+        self._close_heading()
+        self._commit()
+        self.flush()
+
+def iter_site_page_chunks(path, chunk_chars=SITE_CHUNK_CHARS):
+    """HTMLページを解析し、ナレッジベースの項目を1チャンクずつ生成"""
+    page = os.path.splitext(os.path.basename(path))[0]
+    parser = SiteSectionParser(chunk_chars)
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(SITE_READ_BLOCK)
+            if block:
+                parser.feed(block)
+            else:
+                parser.close()
+            while parser.chunks:
+                section_key, chunk_index, heading, text = parser.chunks.popleft()
+                content = f"{heading}: {text}" if heading else text
+                yield {
+                    'id': f"page-{page}-{section_key}-{chunk_index}",
+                    'content': content,
+                    'category': 'site-page',
+                    'source': path,
+                    'vector': text_to_vector(content)
+                }
+            if not block:
+                return
+
+# ページごとの取り込み結果（パス → 更新時刻とチャンク）
+_site_page_index = {}
+
+def ingest_site_pages(paths=SITE_PAGES):
+    """更新時刻が変わったページのみ再解析してインデックスを更新"""
+    for path in paths:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            _site_page_index.pop(path, None)
+            continue
+        entry = _site_page_index.get(path)
+        if entry and entry['mtime'] == mtime:
+            continue
+        items = []
+        try:
+            for item in iter_site_page_chunks(path):
+                items.append(item)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️  Failed to ingest {path}: {e}")
+            continue
+        _site_page_index[path] = {'mtime': mtime, 'items': items}
+        print(f"📄 Ingested {path}: {len(items)} chunks")
+
+def site_page_chunks(paths=SITE_PAGES):
+    """取り込み済みのページごとのチャンクのリスト（取り込み結果そのもの）を返す"""
+    return [_site_page_index[path]['items'] for path in paths if path in _site_page_index]
+
+# ビルド済みインデックス（build-index.py で生成し、api/rag-utils.js と共有）
+# 元データのハッシュが一致する間はベクトル化を省略してそのまま読み込む
+INDEX_PATH = 'data/index.json'
+INDEX_VERSION = 1
+INDEX_SOURCES = ['data/companyInfo.json'] + SITE_PAGES
+
+# 元データのハッシュ（パス → 更新時刻とSHA-256）
+_source_digests = {}
+# 読み込み済みのインデックス（更新時刻とナレッジベース）
+_index_cache = {'mtime': None, 'sources': None, 'knowledge_base': None}
+# インデックスが古い場合に再作成したナレッジベース（元データのハッシュ単位でキャッシュ）
+_rebuilt_cache = {'sources': None, 'knowledge_base': None}
+
+def source_digest(path):
+    """元データのSHA-256（更新時刻が変わったときのみ再計算）"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _source_digests.pop(path, None)
+        return None
+    entry = _source_digests.get(path)
+    if not entry or entry[0] != mtime:
+        with open(path, 'rb') as f:
+            entry = (mtime, hashlib.sha256(f.read()).hexdigest())
+        _source_digests[path] = entry
+    return entry[1]
+
+def current_source_digests():
+    return {path: source_digest(path) for path in INDEX_SOURCES}
+
+def export_index(knowledge_base, sources):
+    """ナレッジベースをインデックスの形式（語彙・疎ベクトル・ノルム・本文）に変換"""
+    vocabulary = {}
+    chunks = []
+    for item in knowledge_base:
+        vector = item.get('vector', {})
+        terms = [vocabulary.setdefault(term, len(vocabulary)) for term in vector]
+        counts = list(vector.values())
+        chunks.append({
+            'id': item['id'],
+            'category': item['category'],
+            'content': item['content'],
+            'terms': terms,
+            'counts': counts,
+            'norm': math.sqrt(sum(count * count for count in counts))
+        })
+    return {
+        'version': INDEX_VERSION,
+        'sources': sources,
+        'vocabulary': list(vocabulary),
+        'chunks': chunks
+    }
+
+def import_index(index):
+    """インデックスをナレッジベースの項目に戻す（ベクトル化は行わない）"""
+    vocabulary = index['vocabulary']
+    return [
+        {
+            'id': chunk['id'],
+            'content': chunk['content'],
+            'category': chunk['category'],
+            'vector': {vocabulary[term]: count for term, count in zip(chunk['terms'], chunk['counts'])},
+            'norm': chunk['norm']
+        }
+        for chunk in index['chunks']
+    ]
+
+def load_index(path=INDEX_PATH):
+    """ビルド済みインデックスを読み込み（ファイルが更新されたときのみ再読み込み）"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+    if _index_cache['mtime'] != mtime:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Failed to load {path}: {e}")
+            return None, None
+        if index.get('version') != INDEX_VERSION:
+            print(f"⚠️  {path} has version {index.get('version')}, expected {INDEX_VERSION}")
+            return None, None
+        _index_cache.update(mtime=mtime, sources=index.get('sources'), knowledge_base=import_index(index))
+    return _index_cache['knowledge_base'], _index_cache['sources']
+
+def load_knowledge_base():
+    """ビルド済みインデックスが最新ならそれを使い、古ければナレッジベースを再作成"""
+    knowledge_base, sources = load_index()
+    digests = current_source_digests()
+    if knowledge_base is not None and sources == digests:
+        return knowledge_base
+    if _rebuilt_cache['sources'] != digests:
+        # 警告は元データ（またはインデックス）が変わって再作成するときに1回だけ出す
+        print(f"⚠️  {INDEX_PATH} is missing or out of date; rebuilding the knowledge base from source files."
+              f" Run: python3 build-index.py")
+        _rebuilt_cache.update(sources=digests, knowledge_base=create_knowledge_base())
+    return _rebuilt_cache['knowledge_base']
 
 def search_relevant_info(query, knowledge_base, top_k=3):
     """関連する情報を検索（キーワードベース + ベクトル類似度）"""
@@ -179,17 +568,7 @@ def search_relevant_info(query, knowledge_base, top_k=3):
                 keyword_matches.append({**item, 'similarity': 0.9, 'match_type': 'keyword'})
     
     # ベクトル類似度による検索
-    query_vector = text_to_vector(query)
-    vector_matches = []
-    
-    for item in knowledge_base:
-        if 'vector' in item and item['vector']:
-            similarity = cosine_similarity(query_vector, item['vector'])
-            if similarity > 0.01:  # 閾値を設定
-                vector_matches.append({**item, 'similarity': similarity, 'match_type': 'vector'})
-    
-    # ベクトル類似度でソート
-    vector_matches.sort(key=lambda x: x['similarity'], reverse=True)
+    vector_matches = vector_search(query, knowledge_base)
     
     # 結果を統合
     all_matches = keyword_matches + vector_matches
@@ -219,6 +598,21 @@ def search_relevant_info(query, knowledge_base, top_k=3):
     
     return result[:top_k]
 
+def vector_search(query, knowledge_base, threshold=0.01):
+    """ベクトル類似度の高い順に項目を返す（api/rag-utils.js の searchRelevantInfo と同じ順位）"""
+    query_vector = text_to_vector(query)
+    vector_matches = []
+    
+    for item in knowledge_base:
+        if 'vector' in item and item['vector']:
+            similarity = cosine_similarity(query_vector, item['vector'])
+            if similarity > threshold:
+                vector_matches.append({**item, 'similarity': similarity, 'match_type': 'vector'})
+    
+    # ベクトル類似度でソート（同値の場合はナレッジベースの順序を維持）
+    vector_matches.sort(key=lambda x: x['similarity'], reverse=True)
+    return vector_matches
+
 def format_context(relevant_info):
     """検索結果をコンテキストとして整形"""
     if not relevant_info:
@@ -230,18 +624,378 @@ def format_context(relevant_info):
     
     return context
 
+# レスポンスのシリアライズ（高速パス）
+# 応答生成関数はテンプレートの静的な断片と動的な値（DynamicText）のリストを返す。
+# 静的な断片はエンコード済みバイト列をキャッシュし、動的な値だけを都度エスケープする
+_CHAT_BODY_PREFIX = b'{"response": '
+_CHAT_BODY_TIMESTAMP = b', "timestamp": "'
+_CHAT_BODY_SUFFIX = b'", "source": "local-rag-mock-api"}'
+
+# チャット応答の固定ヘッダー（Server・Date の後に続く部分、空行を含まない）
+_CHAT_HEADERS = (
+    b"Content-type: application/json\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+    b"Access-Control-Allow-Headers: Content-Type\r\n"
+)
+
+class DynamicText(str):
+    """ユーザー入力など、リクエストごとに変わる応答の断片（キャッシュしない）"""
+
+def dynamic(value):
+    """f文字列と同じ書式で文字列化して動的な断片にする"""
+    return DynamicText(f"{value}")
+
+def reply_text(reply):
+    """応答（文字列または断片のリスト）を1つの文字列にする"""
+    if reply is None or isinstance(reply, str):
+        return reply
+    return ''.join(reply)
+
+def _escape_json_fragment(text):
+    """JSON文字列の中身（前後の引用符なし）としてUTF-8エンコード"""
+    return encode_basestring(text)[1:-1].encode('utf-8')
+
+@lru_cache(maxsize=1024)
+def _cached_json_fragment(text):
+    """テンプレート由来の静的な断片はエンコード結果をキャッシュ"""
+    return _escape_json_fragment(text)
+
+def encode_chat_response(reply, timestamp):
+    """チャット応答のJSONボディを生成
+
+    json.dumps({'response': reply_text(reply), 'timestamp': ..., 'source': ...},
+    ensure_ascii=False).encode('utf-8') とバイト単位で同一の結果を返す。
+    JSON文字列のエスケープは1文字ごとに独立しているため、断片ごとに
+    エスケープして連結しても結果は変わらない。
+    """
+    if reply is None:
+        chunks = [_CHAT_BODY_PREFIX, b'null']
+    else:
+        chunks = [_CHAT_BODY_PREFIX, b'"']
+        for part in ([reply] if isinstance(reply, str) else reply):
+            if type(part) is DynamicText:
+                chunks.append(_escape_json_fragment(part))
+            else:
+                chunks.append(_cached_json_fragment(part))
+        chunks.append(b'"')
+    chunks.append(_CHAT_BODY_TIMESTAMP)
+    chunks.append(_escape_json_fragment(timestamp))
+    chunks.append(_CHAT_BODY_SUFFIX)
+    return b''.join(chunks)
+
+# 管理用エンドポイント（プロファイリング・メモリ調査）
+# LOCAL_API_ADMIN=1 のときのみ有効化し、localhostからのアクセスのみ受け付ける
+ADMIN_PATH_PREFIX = '/api/admin/'
+DEBUG_TIMING_HEADER = 'X-Debug-Timing'
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+LOCAL_HOSTNAMES = ('localhost', '127.0.0.1', '::1')
+
+def _deep_sizeof(obj, seen=None):
+    """オブジェクトのおおよそのメモリ使用量（バイト）を再帰的に計算"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+class RequestTimer:
+    """リクエスト単位の処理時間の内訳を記録"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def header_value(self):
+        """Server-Timing ヘッダーの値を生成"""
+        phases = self.phases + [('total', (self.last - self.started) * 1000)]
+        return ', '.join(f"{name};dur={duration:.3f}" for name, duration in phases)
+
+class AdminTools:
+    """cProfile によるサンプリングと tracemalloc スナップショットを管理"""
+
+    def __init__(self):
+        import cProfile
+        import pstats
+        import tracemalloc
+        self.cProfile = cProfile
+        self.pstats = pstats
+        self.tracemalloc = tracemalloc
+        self.profiler = None
+        self.profile_remaining = 0
+        self.profiled_requests = 0
+        self.snapshots = []
+
+    @staticmethod
+    def _is_local_hostname(netloc):
+        try:
+            return urllib.parse.urlsplit(f"//{netloc}").hostname in LOCAL_HOSTNAMES
+        except ValueError:
+            return False
+
+    @classmethod
+    def is_local(cls, handler):
+        """接続元・Host・Origin がすべてlocalhostの場合のみ許可
+
+        他サイトのページからのクロスサイトリクエストやDNSリバインディングを
+        防ぐため、接続元IPに加えて Host と（指定されていれば）Origin も確認する。
+        """
+        if handler.client_address[0] not in LOCAL_ADDRESSES:
+            return False
+        if not cls._is_local_hostname(handler.headers.get('Host', '')):
+            return False
+        origin = handler.headers.get('Origin')
+        if origin is not None:
+            try:
+                origin_host = urllib.parse.urlsplit(origin).netloc
+            except ValueError:
+                return False
+            if not cls._is_local_hostname(origin_host):
+                return False
+        return True
+
+    def request_timer(self, handler):
+        """デバッグヘッダーが指定されたリクエストのみタイマーを返す"""
+        if handler.headers.get(DEBUG_TIMING_HEADER) and self.is_local(handler):
+            return RequestTimer()
+        return None
+
+    def run_chat_request(self, handle):
+        """プロファイル対象のリクエストであれば cProfile の下で実行"""
+        if not self.profile_remaining:
+            handle()
+            return
+        self.profile_remaining -= 1
+        self.profiled_requests += 1
+        self.profiler.enable()
+        try:
+            handle()
+        finally:
+            self.profiler.disable()
+
+    def handle(self, handler, method):
+        """管理用エンドポイントのルーティング"""
+        if not self.is_local(handler):
+            handler.send_error(403, "Admin endpoints are only available from localhost (checked against peer address, Host and Origin)")
+            return
+        parsed = urllib.parse.urlparse(handler.path)
+        route = parsed.path[len(ADMIN_PATH_PREFIX):].strip('/')
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+        routes = {
+            ('GET', 'sizes'): self.sizes,
+            ('GET', 'profile'): self.profile_status,
+            ('POST', 'profile'): self.start_profile,
+            ('GET', 'profile/stats'): self.profile_stats,
+            ('POST', 'tracemalloc/snapshot'): self.take_snapshot,
+            ('GET', 'tracemalloc/diff'): self.snapshot_diff,
+            ('POST', 'tracemalloc/stop'): self.stop_tracemalloc,
+        }
+        action = routes.get((method, route))
+        if action is None:
+            handler.send_error(404, "Admin endpoint not found")
+            return
+        try:
+            status, content_type, body, extra_headers = action(query)
+        except ValueError as e:
+            handler.send_error(400, str(e))
+            return
+        handler.send_response(status)
+        handler.send_header('Content-type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in extra_headers:
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    @staticmethod
+    def _json(data, status=200):
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        return status, 'application/json', body, []
+
+    @staticmethod
+    def _int_param(query, name, default):
+        try:
+            value = int(query.get(name, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"'{name}' must be an integer")
+        if value <= 0:
+            raise ValueError(f"'{name}' must be positive")
+        return value
+
+    def sizes(self, query):
+        """ナレッジベース・インデックス・キャッシュのサイズを報告"""
+        knowledge_base = load_knowledge_base()
+        vocabulary = set()
+        for item in knowledge_base:
+            vocabulary.update(item.get('vector', {}))
+        fragment_cache = _cached_json_fragment.cache_info()
+        return self._json({
+            'knowledge_base': {
+                'items': len(knowledge_base),
+                'content_chars': sum(len(item['content']) for item in knowledge_base),
+                'bytes': _deep_sizeof(list(knowledge_base)),
+            },
+            'index': {
+                'vocabulary': len(vocabulary),
+                'postings': sum(len(item.get('vector', {})) for item in knowledge_base),
+                'bytes': _deep_sizeof([item.get('vector', {}) for item in knowledge_base]),
+                'prebuilt': knowledge_base is _index_cache['knowledge_base'],
+            },
+            'caches': {
+                'json_fragments': {
+                    'hits': fragment_cache.hits,
+                    'misses': fragment_cache.misses,
+                    'entries': fragment_cache.currsize,
+                    'max_entries': fragment_cache.maxsize,
+                },
+                'site_pages': {
+                    'pages': len(_site_page_index),
+                    'chunks': sum(len(entry['items']) for entry in _site_page_index.values()),
+                    'bytes': _deep_sizeof(_site_page_index),
+                },
+            },
+        })
+
+    def profile_status(self, query):
+        return self._json({
+            'remaining': self.profile_remaining,
+            'profiled_requests': self.profiled_requests,
+        })
+
+    def start_profile(self, query):
+        """次のN件のチャットリクエストをプロファイル（既存の結果は破棄）"""
+        self.profile_remaining = self._int_param(query, 'requests', 10)
+        self.profiled_requests = 0
+        self.profiler = self.cProfile.Profile()
+        return self.profile_status(query)
+
+    def profile_stats(self, query):
+        """プロファイル結果をダウンロード（既定は pstats 形式、format=text でテキスト）"""
+        if self.profiler is None or not self.profiled_requests:
+            raise ValueError("No profiled requests yet")
+        stats = self.pstats.Stats(self.profiler)
+        if query.get('format') == 'text':
+            stream = io.StringIO()
+            stats.stream = stream
+            sort_key = query.get('sort', 'cumulative')
+            if sort_key not in stats.sort_arg_dict_default:
+                raise ValueError(f"'sort' must be one of {', '.join(sorted(stats.sort_arg_dict_default))}")
+            stats.sort_stats(sort_key)
+            stats.print_stats(self._int_param(query, 'limit', 30))
+            return 200, 'text/plain; charset=utf-8', stream.getvalue().encode('utf-8'), []
+        # pstats.Stats.dump_stats と同じ形式（pstats.Stats(ファイル名) で読み込み可能）
+        body = marshal.dumps(stats.stats)
+        return 200, 'application/octet-stream', body, [
+            ('Content-Disposition', 'attachment; filename="local-api-server.pstats"'),
+        ]
+
+    def take_snapshot(self, query):
+        """tracemalloc のスナップショットを取得（初回呼び出しで追跡を開始）"""
+        if not self.tracemalloc.is_tracing():
+            self.tracemalloc.start(self._int_param(query, 'frames', 1))
+        self.snapshots.append(self.tracemalloc.take_snapshot())
+        # 差分に必要な直近2件だけを保持
+        self.snapshots = self.snapshots[-2:]
+        current, peak = self.tracemalloc.get_traced_memory()
+        return self._json({
+            'snapshots': len(self.snapshots),
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+        })
+
+    def snapshot_diff(self, query):
+        """直近2件のスナップショットの差分を上位から報告"""
+        if len(self.snapshots) < 2:
+            raise ValueError("Take at least two snapshots before diffing")
+        key_type = query.get('key', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            raise ValueError("'key' must be one of lineno, filename, traceback")
+        limit = self._int_param(query, 'limit', 20)
+        stats = self.snapshots[-1].compare_to(self.snapshots[-2], key_type)
+        return self._json({
+            'top': [
+                {
+                    'location': str(stat.traceback),
+                    'size_bytes': stat.size,
+                    'size_diff_bytes': stat.size_diff,
+                    'count': stat.count,
+                    'count_diff': stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        })
+
+    def stop_tracemalloc(self, query):
+        self.snapshots = []
+        if self.tracemalloc.is_tracing():
+            self.tracemalloc.stop()
+        return self._json({'tracing': False})
+
+ADMIN = AdminTools() if os.environ.get('LOCAL_API_ADMIN') == '1' else None
+
+# トラフィックキャプチャ（負荷試験・回帰試験用の記録）
+# LOCAL_API_CAPTURE=<ファイルパス> のときのみ /api/chat のリクエストをJSONLで追記する
+def response_digest(response):
+    """応答本文のハッシュ（タイムスタンプを含まないため再生時に比較可能）"""
+    return hashlib.sha256((response or '').encode('utf-8')).hexdigest()
+
+class TrafficCapture:
+    """/api/chat のリクエストを1行1件のJSONLで記録"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def record(self, arrived_at, message, form_data, response):
+        entry = {
+            't': round(arrived_at, 6),
+            'message': message,
+            'formData': form_data,
+            'sha256': response_digest(response),
+        }
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+CAPTURE = TrafficCapture(os.environ['LOCAL_API_CAPTURE']) if os.environ.get('LOCAL_API_CAPTURE') else None
+
 RAG_AVAILABLE = True
 
 class MockAPIHandler(http.server.SimpleHTTPRequestHandler):
+    def do_GET(self):
+        """GETリクエストを処理（管理用エンドポイント以外は静的ファイル）"""
+        if ADMIN is not None and self.path.startswith(ADMIN_PATH_PREFIX):
+            ADMIN.handle(self, 'GET')
+        else:
+            super().do_GET()
+
     def do_POST(self):
         """POSTリクエストを処理"""
         if self.path == '/api/chat':
-            self.handle_chat_api()
+            if ADMIN is None:
+                self.handle_chat_api()
+            else:
+                ADMIN.run_chat_request(self.handle_chat_api)
+        elif ADMIN is not None and self.path.startswith(ADMIN_PATH_PREFIX):
+            ADMIN.handle(self, 'POST')
         else:
             self.send_error(404, "API endpoint not found")
     
     def handle_chat_api(self):
         """チャットAPIのRAG対応モック処理"""
+        timer = ADMIN.request_timer(self) if ADMIN is not None else None
+        arrived_at = time.time() if CAPTURE is not None else None
         try:
             # リクエストボディを読み取り
             content_length = int(self.headers['Content-Length'])
@@ -251,6 +1005,8 @@ class MockAPIHandler(http.server.SimpleHTTPRequestHandler):
             data = json.loads(post_data.decode('utf-8'))
             message = data.get('message', '')
             form_data = data.get('formData', {})
+            if timer:
+                timer.mark('parse')
             
             print(f"📝 Received message: {message}")
             print(f"📊 Form data: {form_data}")
@@ -258,35 +1014,39 @@ class MockAPIHandler(http.server.SimpleHTTPRequestHandler):
             # RAG対応のモック応答を生成
             print("🚀 Starting RAG processing...")
             print(f"📝 Message: '{message}'")
-            mock_response = self.generate_rag_mock_response(message, form_data)
+            reply = self.generate_rag_mock_response(message, form_data)
             print(f"✅ RAG processing completed")
+            if timer:
+                timer.mark('rag')
+            if CAPTURE is not None:
+                CAPTURE.record(arrived_at, message, form_data, reply_text(reply))
             
-            # レスポンスを送信
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            
-            response_data = {
-                'response': mock_response,
-                'timestamp': datetime.now().isoformat(),
-                'source': 'local-rag-mock-api'
-            }
+            # レスポンスボディを生成（動的な断片のみエスケープ）
+            body = encode_chat_response(reply, datetime.now().isoformat())
             
-            self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode('utf-8'))
+            # ステータス行・ヘッダー・ボディを組み立てて1回の書き込みで送信
+            # （send_response/end_headers はヘッダーとボディを別々に書き込むため使わない）
+            self.log_request(200)
+            head = [
+                f"{self.protocol_version} 200 OK\r\n"
+                f"Server: {self.version_string()}\r\n"
+                f"Date: {self.date_time_string()}\r\n".encode('latin-1', 'strict')
+            ]
+            if timer:
+                timer.mark('encode')
+                head.append(f"Server-Timing: {timer.header_value()}\r\n".encode('latin-1', 'strict'))
+            self.wfile.write(b''.join(head) + _CHAT_HEADERS + b"\r\n" + body)
             
         except Exception as e:
             print(f"❌ Error processing request: {e}")
             self.send_error(500, f"Internal server error: {str(e)}")
     
     def generate_rag_mock_response(self, message, form_data):
-        """RAG対応のモック応答を生成"""
+        """RAG対応のモック応答を生成（テンプレートの断片と DynamicText のリストを返す）"""
         try:
-            print("🔍 Creating knowledge base...")
-            knowledge_base = create_knowledge_base()
-            print(f"📚 Knowledge base created with {len(knowledge_base)} items")
+            print("🔍 Loading knowledge base...")
+            knowledge_base = load_knowledge_base()
+            print(f"📚 Knowledge base loaded with {len(knowledge_base)} items")
             
             print("🔍 Searching relevant information...")
             relevant_info = search_relevant_info(message, knowledge_base, 3)
@@ -299,26 +1059,26 @@ class MockAPIHandler(http.server.SimpleHTTPRequestHandler):
             
             # RAG対応の応答を生成（改良版）
             if context and context != "関連する情報が見つかりませんでした。":
-                form_info = ""
+                form_info = []
                 if form_data:
                     if form_data.get('name'):
-                        form_info += f"お名前: {form_data['name']}様\n"
+                        form_info += ["お名前: ", dynamic(form_data['name']), "様\n"]
                     if form_data.get('company'):
-                        form_info += f"会社名: {form_data['company']}\n"
+                        form_info += ["会社名: ", dynamic(form_data['company']), "\n"]
                 
                 # メッセージに基づいて具体的な回答を生成
                 response = self.generate_specific_response(message, relevant_info, form_data, form_info)
             else:
                 # コンテキストがない場合は基本的な応答
-                response = f"""お問い合わせいただき、ありがとうございます！
+                response = ["""お問い合わせいただき、ありがとうございます！
 
-{message}についてお答えいたします。
+""", dynamic(message), """についてお答えいたします。
 
 TechCorpはAI技術を活用した企業向けソリューションを提供しています。
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
             
             return response
             
@@ -532,7 +1292,7 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
                 return "システム開発をお考えですね。お客様のご要望に応じたシステムを開発いたします。どのようなシステムをお考えでしょうか？"
         
         # デフォルト応答（制限事項付き）
-        return f"""「{message}」についてお聞きしました。
+        return ["「", dynamic(message), """」についてお聞きしました。
 
 申し訳ございませんが、お客様のご質問について、当社のホームページに記載されている情報の中では、適切な回答を提供できません。
 
@@ -552,7 +1312,7 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先**:
 ・電話: 03-1234-5678
-・メール: info@allgens.co.jp"""
+・メール: info@allgens.co.jp"""]
     
     def do_OPTIONS(self):
         """CORSプリフライトリクエストを処理"""
@@ -573,13 +1333,13 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
         if any(keyword in message_lower for keyword in ['代表', '代表者', 'ceo', '社長', '取締役', '誰']):
             for item in relevant_info:
                 if item['category'] == 'representative':
-                    return f"""お問い合わせいただき、ありがとうございます！
+                    return ["""お問い合わせいただき、ありがとうございます！
 
 **代表者について**
 
-{item['content']}
+""", item['content'], """
 
-{form_info}
+""", *form_info, """
 
 **重要事項：**
 • 上記の情報は当社の公式情報に基づいてお答えしています
@@ -590,20 +1350,20 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
         
         # 料金に関する質問
         elif any(keyword in message_lower for keyword in ['料金', '価格', '費用', 'いくら', 'コスト']):
             service_info = [item for item in relevant_info if item['category'] == 'service']
             if service_info:
-                response = f"""お問い合わせいただき、ありがとうございます！
+                response = ["""お問い合わせいただき、ありがとうございます！
 
 **料金について**
 
-"""
+"""]
                 for item in service_info:
-                    response += f"• {item['content']}\n\n"
-                response += f"""{form_info}
+                    response += ["• ", item['content'], "\n\n"]
+                response += [*form_info, """
 
 **重要事項：**
 • 上記の料金情報は当社の公式情報に基づいてお答えしています
@@ -615,21 +1375,21 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
                 return response
         
         # サービスに関する質問
         elif any(keyword in message_lower for keyword in ['サービス', '何が', 'できる', '提供', '選択']):
             service_info = [item for item in relevant_info if item['category'] == 'service']
             if service_info:
-                response = f"""お問い合わせいただき、ありがとうございます！
+                response = ["""お問い合わせいただき、ありがとうございます！
 
 **提供サービス**
 
-"""
+"""]
                 for item in service_info:
-                    response += f"• {item['content']}\n\n"
-                response += f"""{form_info}
+                    response += ["• ", item['content'], "\n\n"]
+                response += [*form_info, """
 
 **重要事項：**
 • 上記のサービス情報は当社の公式情報に基づいてお答えしています
@@ -641,21 +1401,21 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
                 return response
         
         # 連絡先に関する質問
         elif any(keyword in message_lower for keyword in ['連絡', '電話', 'メール', '住所', 'アクセス', 'お問い合わせ']):
             contact_info = [item for item in relevant_info if item['category'] == 'contact']
             if contact_info:
-                response = f"""お問い合わせいただき、ありがとうございます！
+                response = ["""お問い合わせいただき、ありがとうございます！
 
 **連絡先情報**
 
-"""
+"""]
                 for item in contact_info:
-                    response += f"{item['content']}\n\n"
-                response += f"""{form_info}
+                    response += [item['content'], "\n\n"]
+                response += [*form_info, """
 
 **重要事項：**
 • 上記の連絡先情報は当社の公式情報に基づいてお答えしています
@@ -667,21 +1427,21 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
                 return response
         
         # 会社情報に関する質問
         elif any(keyword in message_lower for keyword in ['会社', '企業', '概要', '情報', 'techcorp', 'サンプル']):
             company_info = [item for item in relevant_info if item['category'] == 'company']
             if company_info:
-                response = f"""お問い合わせいただき、ありがとうございます！
+                response = ["""お問い合わせいただき、ありがとうございます！
 
 **会社概要**
 
-"""
+"""]
                 for item in company_info:
-                    response += f"{item['content']}\n\n"
-                response += f"""{form_info}
+                    response += [item['content'], "\n\n"]
+                response += [*form_info, """
 
 **重要事項：**
 • 上記の会社情報は当社の公式情報に基づいてお答えしています
@@ -693,20 +1453,20 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
                 return response
         
         # その他の質問（高精度版）
         else:
             context = format_context(relevant_info)
             if context and context != "関連する情報が見つかりませんでした。":
-                return f"""お問い合わせいただき、ありがとうございます！
+                return ["""お問い合わせいただき、ありがとうございます！
 
-{context}
+""", context, """
 
 上記の情報を参考に、お客様のご質問にお答えいたします。
 
-{form_info}
+""", *form_info, """
 
 **重要事項：**
 • 上記の情報は当社の公式情報に基づいてお答えしています
@@ -718,12 +1478,12 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
             else:
                 # 関連情報が見つからない場合の制限された回答
-                return f"""お問い合わせいただき、ありがとうございます！
+                return ["""お問い合わせいただき、ありがとうございます！
 
-申し訳ございませんが、お客様のご質問「{message}」について、当社のホームページに記載されている情報の中では、適切な回答を提供できません。
+申し訳ございませんが、お客様のご質問「""", dynamic(message), """」について、当社のホームページに記載されている情報の中では、適切な回答を提供できません。
 
 **当社がお答えできる情報：**
 • 会社概要・代表者情報
@@ -732,26 +1492,39 @@ TechCorpはAI技術を活用した企業向けソリューションを提供し
 • 連絡先・アクセス情報
 • よくある質問（FAQ）
 
-{form_info}
+""", *form_info, """
 
 **お客様のご質問について：**
 より具体的なご質問や、上記の情報に関する詳細なご相談がございましたら、お気軽にお尋ねください。初回相談は無料で承っております。
 
 📞 **お問い合わせ先：**
 • 電話: 03-1234-5678
-• メール: contact@example.com"""
+• メール: contact@example.com"""]
+
+class LocalAPIServer(socketserver.TCPServer):
+    """リクエストを1件ずつ処理するサーバー
+
+    replay-traffic.py で同時接続数を増やしたときに接続がリセットされないよう、
+    待ち受けキューを既定の5より大きくしている（処理自体は並列化しない）。
+    """
+
+    request_queue_size = 128
 
 def run_server(port=8000):
     """サーバーを起動"""
     handler = MockAPIHandler
     
-    with socketserver.TCPServer(("", port), handler) as httpd:
+    with LocalAPIServer(("", port), handler) as httpd:
         print(f"🚀 ローカルAPIサーバーが起動しました")
         print(f"📡 ポート: {port}")
         print(f"🔗 URL: http://localhost:{port}")
         print(f"📝 チャットAPI: http://localhost:{port}/api/chat")
         print(f"🧪 デバッグページ: http://localhost:{port}/debug.html")
         print(f"📋 お問い合わせページ: http://localhost:{port}/contact.html")
+        if ADMIN is not None:
+            print(f"🛠️  管理用エンドポイント: http://localhost:{port}{ADMIN_PATH_PREFIX} (localhostのみ)")
+        if CAPTURE is not None:
+            print(f"🎥 トラフィックキャプチャ: {CAPTURE.path}")
         print(f"\n⏹️  停止するには Ctrl+C を押してください")
         print("=" * 50)
         
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+キャプチャしたトラフィックの再生ツール（負荷試験・回帰試験用）
+LOCAL_API_CAPTURE で記録したJSONLを読み込み、/api/chat に同じリクエストを送信します
+
+使い方:
+    python3 replay-traffic.py capture.jsonl                   # 記録時と同じ間隔で再生
+    python3 replay-traffic.py capture.jsonl --speed 10        # 10倍速で再生
+    python3 replay-traffic.py capture.jsonl --speed 0 -c 8    # 最大速度・同時接続8で再生
+
+local-api-server.py はリクエストを1件ずつ処理するため、同時接続数を増やしてもスループットは
+上がらず、サーバー側の待ち時間がレイテンシに加わる。
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+def load_capture(path):
+    """キャプチャログを読み込み（到着時刻順）"""
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"⚠️  {path}:{line_number} をスキップしました: {e}")
+    entries.sort(key=lambda entry: entry.get('t', 0))
+    return entries
+
+def response_digest(response):
+    """応答本文のハッシュ（local-api-server.py の response_digest と同じ）"""
+    return hashlib.sha256((response or '').encode('utf-8')).hexdigest()
+
+def send_request(url, entry, timeout, scheduled):
+    """1件のリクエストを送信し、(レイテンシ秒, ステータス, 応答ハッシュ) を返す
+
+    scheduled（time.perf_counter）を指定した場合は、実際の送信時刻ではなく予定送信時刻から
+    計測する。記録時の間隔で再生するとき、同時接続数が足りず予定より送信が遅れた場合も、
+    その待ち時間を含めるため。None の場合（最大速度での再生）は送信を開始した時刻から計測する。
+    """
+    started = time.perf_counter() if scheduled is None else scheduled
+    body = json.dumps(
+        {'message': entry.get('message', ''), 'formData': entry.get('formData', {})},
+        ensure_ascii=False
+    ).encode('utf-8')
+    path = url.path or '/api/chat'
+    if url.query:
+        path += '?' + url.query
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        connection.request('POST', path, body, {
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(body)),
+        })
+        response = connection.getresponse()
+        payload = response.read()
+        latency = time.perf_counter() - started
+        digest = None
+        if response.status == 200:
+            digest = response_digest(json.loads(payload.decode('utf-8')).get('response') or '')
+        return latency, response.status, digest
+    finally:
+        connection.close()
+
+def percentile(sorted_values, p):
+    """線形補間によるパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def replay(entries, url, speed, concurrency, timeout):
+    """ログを再生し、レイテンシと応答の差分を集計"""
+    latencies = []
+    mismatches = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(index, entry, scheduled):
+        try:
+            latency, status, digest = send_request(url, entry, timeout, scheduled)
+        except Exception as e:
+            with lock:
+                errors.append((index, str(e)))
+            return
+        with lock:
+            latencies.append(latency)
+            if status != 200:
+                errors.append((index, f"HTTP {status}"))
+            elif entry.get('sha256') and digest != entry['sha256']:
+                mismatches.append((index, entry.get('message', '')))
+
+    first_arrival = entries[0].get('t', 0) if entries else 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, entry in enumerate(entries):
+            # 記録時の到着間隔を speed 倍に圧縮して送信（speed=0 は待機なし）
+            scheduled = None
+            if speed > 0:
+                scheduled = started + (entry.get('t', first_arrival) - first_arrival) / speed
+                wait = scheduled - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            executor.submit(run, index, entry, scheduled)
+    elapsed = time.perf_counter() - started
+    return latencies, mismatches, errors, elapsed
+
+def print_report(total, latencies, mismatches, errors, elapsed):
+    """結果を表示"""
+    latencies = sorted(latencies)
+    print("=" * 50)
+    print(f"📨 リクエスト数: {total}")
+    print(f"⏱️  所要時間: {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+    if latencies:
+        print("📊 レイテンシ (ms):")
+        for p in (50, 90, 95, 99):
+            print(f"  p{p}: {percentile(latencies, p) * 1000:.2f}")
+        print(f"  max: {latencies[-1] * 1000:.2f}")
+    print(f"❌ エラー: {len(errors)}")
+    for index, error in errors[:10]:
+        print(f"  - #{index}: {error}")
+    print(f"⚠️  応答の差分: {len(mismatches)}")
+    for index, message in mismatches[:10]:
+        print(f"  - #{index}: {message}")
+
+def main():
+    parser = argparse.ArgumentParser(description="キャプチャしたトラフィックを /api/chat に再生します")
+    parser.add_argument('capture', help="LOCAL_API_CAPTURE で記録したJSONLファイル")
+    parser.add_argument('--url', default='http://localhost:8000/api/chat', help="送信先URL")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="再生速度の倍率（1=記録時と同じ、0=待機なしの最大速度）")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="同時接続数")
+    parser.add_argument('--timeout', type=float, default=30.0, help="1リクエストのタイムアウト（秒）")
+    args = parser.parse_args()
+
+    if args.speed < 0:
+        parser.error("--speed must be 0 or greater")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be 1 or greater")
+
+    entries = load_capture(args.capture)
+    if not entries:
+        print("⚠️  再生するリクエストがありません")
+        return 1
+
+    url = urllib.parse.urlparse(args.url)
+    if url.scheme != 'http' or not url.hostname:
+        parser.error("--url must be an http:// URL (https is not supported)")
+    print(f"🚀 {len(entries)}件のリクエストを再生します ({args.url}, speed={args.speed}, concurrency={args.concurrency})")
+    latencies, mismatches, errors, elapsed = replay(entries, url, args.speed, args.concurrency, args.timeout)
+    print_report(len(entries), latencies, mismatches, errors, elapsed)
+    return 1 if mismatches or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())